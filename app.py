@@ -1,45 +1,215 @@
 # libraries to be imported
+import hashlib
+import inspect
+import os
 import plotly.express as px
 import pandas as pd
+import pyarrow
 import numpy as np
 import dash
-from dash import Dash, dcc, html, Input, Output
-from dash.exceptions import PreventUpdate
+from dash import Dash, dcc, html, Input, Output, State, ClientsideFunction
 
 # Path to the data file
 file_path = 'data/data_sim_updated.csv'
 
-# Load the dataset into a Pandas DataFrame
-df = pd.read_csv(file_path)
+# Columns of the data file, all read as plain Python strings so the categories
+# come back with the same dtype from the Parquet copy
+column_dtypes = {
+    'Course': str, 'COVID Impact': str, 'First Generation': str,
+    'Gender': str, 'Race/Ethnicity': str, 'Grade': str,
+    'Semester': str
+}
 
-# Handle Missing Values
-df.dropna(inplace=True)
+# Numerical scale for each letter grade
+grade_mapping = {
+    'A+': 4.33, 'A': 4.00, 'A-': 3.67,
+    'B+': 3.33, 'B': 3.00, 'B-': 2.67,
+    'C+': 2.33, 'C': 2.00, 'C-': 1.67,
+    'D+': 1.33, 'D': 1.00, 'D-': 0.67,
+    'F': 0.00, 'W': -0.3
+}
 
-# Convert Grades to a Numerical Scale
-def grade_to_number(grade):
-    grade_mapping = {
-        'A+': 4.33, 'A': 4.00, 'A-': 3.67,
-        'B+': 3.33, 'B': 3.00, 'B-': 2.67,
-        'C+': 2.33, 'C': 2.00, 'C-': 1.67,
-        'D+': 1.33, 'D': 1.00, 'D-': 0.67,
-        'F': 0.00, 'W': -0.3
-    }
-    return grade_mapping.get(grade, np.nan)
+# Grade order used for both the categorical dtype and the plot axis
+grade_order = ["W", "F", "D-", "D", "D+", "C-",
+               "C", "C+", "B-", "B", "B+", "A-", "A", "A+"]
 
+# Repeated string columns stored as categoricals to speed up grouping
+categorical_columns = ['Gender', 'Race/Ethnicity', 'Course', 'Semester',
+                       'COVID Impact', 'First Generation']
 
-# Apply the conversion function to the grade column
-df['grade_numeric'] = df['Grade'].apply(grade_to_number)
 
-# Drop rows where conversion resulted in NaN
-df.dropna(subset=['grade_numeric'], inplace=True)
+def load_and_preprocess_csv():
+    # Load the dataset into a Pandas DataFrame using the multithreaded Arrow parser
+    df = pd.read_csv(file_path, engine='pyarrow',
+                     usecols=list(column_dtypes), dtype=column_dtypes)
 
-# Ensure data consistency
-df['Gender'] = df['Gender'].str.lower()
-df['Race/Ethnicity'] = df['Race/Ethnicity'].str.lower()  # Corrected column name
-df['Course'] = df['Course'].str.upper()
+    # Handle Missing Values
+    df.dropna(inplace=True)
+
+    # Drop rows whose grade is not on the grading scale
+    df = df[df['Grade'].isin(grade_mapping)].copy()
+
+    for col in categorical_columns:
+        df[col] = df[col].astype('category')
+    df['Grade'] = df['Grade'].astype(
+        pd.CategoricalDtype(grade_order, ordered=True))
+
+    # Ensure data consistency; map() only rewrites the category labels and
+    # merges labels that differ only in case
+    df['Gender'] = df['Gender'].map(str.lower).astype('category')
+    df['Race/Ethnicity'] = df['Race/Ethnicity'].map(
+        str.lower).astype('category')
+    df['Course'] = df['Course'].map(str.upper).astype('category')
+    return df
+
+
+# Fingerprint of the preprocessing code and its settings, so a Parquet copy
+# written by any other version of them is never reused
+preprocess_version = hashlib.sha1((
+    inspect.getsource(load_and_preprocess_csv) +
+    repr((column_dtypes, grade_mapping, grade_order, categorical_columns))
+).encode()).hexdigest()[:12]
+
+# Path to the preprocessed copy of the data file
+parquet_path = f'data/data_sim_updated.{preprocess_version}.parquet'
+
+
+def cache_is_current(path):
+    return (os.path.exists(path) and
+            os.path.getmtime(path) >= os.path.getmtime(file_path))
+
+
+def write_cache(path, write):
+    # Write through a temporary file so a partial write is never picked up;
+    # caches are optional, so a failed write (e.g. read-only data/) is ignored
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_data():
+    # Use the preprocessed copy when it is current and readable
+    if cache_is_current(parquet_path):
+        try:
+            return pd.read_parquet(parquet_path)
+        except (OSError, pyarrow.ArrowInvalid):
+            pass
+
+    df = load_and_preprocess_csv()
+    write_cache(parquet_path, df.to_parquet)
+    return df
+
+
+# Load the preprocessed data, rebuilding it when missing or out of date
+df = load_data()
+
+# Categories offered in the dropdowns
+primary_categories = ['Course', 'COVID Impact', 'First Generation',
+                      'Gender', 'Race/Ethnicity', 'Semester']
+
+# Overview options, shared by the layout and the drill-down options below
+primary_options = tuple({'label': col, 'value': col}
+                        for col in primary_categories)
+
+# Drill-down options for each overview category
+secondary_options = {
+    primary: [option for option in primary_options
+              if option['value'] != primary]
+    for primary in primary_categories
+}
+
+
+def aggregate_grades(primary, secondary=None):
+    # Count every category/grade combination from the categorical codes,
+    # using one flat index per row instead of a hash-based groupby
+    group_fields = [primary] + ([secondary] if secondary else []) + ['Grade']
+    codes = [df[col].cat.codes.to_numpy() for col in group_fields]
+    shape = tuple(len(df[col].cat.categories) for col in group_fields)
+    grade_counts = np.bincount(np.ravel_multi_index(codes, shape),
+                               minlength=np.prod(shape)).reshape(shape)
+    group_totals = grade_counts.sum(axis=-1)
+
+    # Reshape to one row per observed category/grade combination
+    observed = np.nonzero(grade_counts)
+    counts = pd.DataFrame({
+        col: pd.Categorical.from_codes(col_codes, dtype=df[col].dtype)
+        for col, col_codes in zip(group_fields, observed)
+    })
+    counts['counts'] = grade_counts[observed]
+    counts['percentage'] = (grade_counts[observed] /
+                            group_totals[observed[:-1]]) * 100
+    return counts
+
+
+# Precompute the grade distribution for every dropdown combination
+agg_cache = {
+    (primary, secondary): aggregate_grades(primary, secondary)
+    for primary in primary_categories
+    for secondary in primary_categories + [None]
+    if secondary != primary
+}
+
+
+def build_figure(primary, secondary=None):
+    # This step might include filtering or adjusting df based on the selections
+    filtered_df = df  # Assuming no additional filtering is required
+
+    # Look up the precomputed counts and percentages for the selections
+    counts = agg_cache[(primary, secondary)]
+
+    # Determine dynamic height
+    if secondary:
+        unique_values = filtered_df[secondary].nunique()
+        height_per_subplot = 900  # Set minimum height per subplot
+        # Ensure a minimum total height
+        total_height = max(unique_values * height_per_subplot, 900)
+    else:
+        total_height = 1000
+
+    # Counts are grouped unsorted, so pin the legend and facet order explicitly
+    category_orders = {"Grade": grade_order}
+    for col in [primary] + ([secondary] if secondary else []):
+        category_orders[col] = list(df[col].cat.categories)
+
+    # Generate the figure based on the primary and (optionally) secondary selections
+    fig = px.bar(counts, y='Grade', x='percentage', color=primary,
+                 facet_row=secondary,  # Use facet_row if secondary selection is made
+                 orientation='h',
+                 barmode='group',  # Display bars side by side
+                 title=f'Distribution by {primary}' + \
+                 (f' and {secondary}' if secondary else ''),
+                 labels={'percentage': 'Percentage of Total', 'counts': 'Count'},
+                 category_orders=category_orders,
+                 # Include percentage
+                 hover_data={'percentage': True},
+                 text='counts')  # Show counts on the bars and in the hover
+
+    fig.update_traces(texttemplate='%{text:d}')
+
+    fig.update_layout(plot_bgcolor='white',
+                      paper_bgcolor='white', height=total_height, title_font_color='blue', title_font_size=30, title_font_family="Balto")
+
+    fig.update_xaxes(matches=None, showticklabels=True)
+    return fig
+
+
+# Every figure serialized once to a JSON string, so the layout embeds them
+# without re-encoding the Plotly dicts; the browser picks from these on
+# dropdown changes
+figure_cache = {
+    f'{primary}|{secondary or ""}': build_figure(primary, secondary).to_json()
+    for primary, secondary in agg_cache
+}
+
+# Style shared by the two side-by-side dropdown containers
+dropdown_style = {'width': '48%', 'display': 'inline-block'}
 
 # Initialize Dash app
-app = Dash(__name__)
+app = Dash(__name__, compress=True)  # gzip the layout with its embedded figures
 server = app.server
 
 # Define the layout of the app and app use guide
@@ -64,18 +234,11 @@ app.layout = html.Div([
                 'Overview Category "Course" with option to choose other options to filter data.'),
             dcc.Dropdown(
                 id='primary-category-dropdown',
-                options=[
-                    {'label': 'Course', 'value': 'Course'},
-                    {'label': 'COVID Impact', 'value': 'COVID Impact'},
-                    {'label': 'First Generation', 'value': 'First Generation'},
-                    {'label': 'Gender', 'value': 'Gender'},
-                    {'label': 'Race/Ethnicity', 'value': 'Race/Ethnicity'},
-                    {'label': 'Semester', 'value': 'Semester'},
-                ],
+                options=primary_options,
                 value='Course',  # Default or initial value
                 clearable=False
             ),
-        ], style={'width': '48%', 'display': 'inline-block'}),
+        ], style=dropdown_style),
 
         # Drill-down Dropdown
         html.Div([
@@ -85,87 +248,38 @@ app.layout = html.Div([
                 id='secondary-category-dropdown',
                 clearable=True  # Ensure this dropdown is clearable
             ),
-        ], style={'width': '48%', 'display': 'inline-block', 'marginLeft': '4%'}),
+        ], style={**dropdown_style, 'marginLeft': '4%'}),
     ]),
 
     dcc.Graph(id='grade-distribution-graph'),
-])
-
-# Callbacks to make the graphs responsive of the changes in the dropdowns
 
+    # Precomputed drill-down options and figures for the clientside callbacks
+    dcc.Store(id='options-cache', data=secondary_options),
+    dcc.Store(id='fig-cache', data=figure_cache),
+])
 
-@app.callback(
+# Callbacks to make the graphs responsive of the changes in the dropdowns,
+# run in the browser against the caches embedded in the layout
+# (see assets/figures.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='figs', function_name='options'),
     Output('secondary-category-dropdown', 'options'),
-    [Input('primary-category-dropdown', 'value')]
+    [Input('primary-category-dropdown', 'value')],
+    [State('options-cache', 'data')]
 )
-def set_secondary_options(selected_primary):
-    all_options = [col for col in df.columns if col not in [
-        'Grade', 'grade_numeric', selected_primary]]
-    return [{'label': col, 'value': col} for col in all_options]
 
-
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='figs', function_name='pick'),
     Output('grade-distribution-graph', 'figure'),
     [Input('primary-category-dropdown', 'value'),
-     Input('secondary-category-dropdown', 'value')]
+     Input('secondary-category-dropdown', 'value')],
+    [State('fig-cache', 'data')]
 )
-def update_graph(primary_selection, secondary_selection):
-    if not primary_selection:
-        raise PreventUpdate
-
-    # Determine which columns to use for coloring and faceting based on selections
-    color_col = primary_selection if primary_selection in df.columns else None
-    facet_row = secondary_selection if secondary_selection and secondary_selection in df.columns and secondary_selection != primary_selection else None
-
-    # This step might include filtering or adjusting df based on the selections
-    filtered_df = df  # Assuming no additional filtering is required
-
-    # Group and calculate percentages for the selected categories
-    if facet_row:
-        # If there's a secondary selection, include it in grouping
-        group_fields = [color_col, facet_row, 'Grade']
-    else:
-        # Otherwise, just use the primary selection and Grade
-        group_fields = [color_col, 'Grade']
-
-    counts = filtered_df.groupby(
-        group_fields).size().reset_index(name='counts')
-    total_counts = counts.groupby(group_fields[:-1])['counts'].transform('sum')
-    counts['percentage'] = (counts['counts'] / total_counts) * 100
-
-    # Add a text column for hover information, showing counts
-    counts['Count'] = counts['counts'].astype(str)
-
-    # Determine dynamic height
-    if secondary_selection and primary_selection != secondary_selection:
-        unique_values = filtered_df[secondary_selection].nunique()
-        height_per_subplot = 900  # Set minimum height per subplot
-        # Ensure a minimum total height
-        total_height = max(unique_values * height_per_subplot, 900)
-    else:
-        total_height = 1000
-
-    # Generate the figure based on the primary and (optionally) secondary selections
-    fig = px.bar(counts, y='Grade', x='percentage', color=color_col,
-                 facet_row=facet_row,  # Use facet_row if secondary selection is made
-                 orientation='h',
-                 barmode='group',  # Display bars side by side
-                 title=f'Distribution by {primary_selection}' + \
-                 (f' and {secondary_selection}' if facet_row else ''),
-                 labels={'percentage': 'Percentage of Total'},
-                 category_orders={"Grade": [
-                     "W", "F", "D-", "D", "D+", "C-", "C", "C+", "B-", "B", "B+", "A-", "A", "A+"]},
-                 # Include percentage
-                 hover_data={'percentage': True, 'counts': False},
-                 text='Count')  # Use hover_text for hover information
-
-    fig.update_layout(plot_bgcolor='white',
-                      paper_bgcolor='white', height=total_height, title_font_color='blue', title_font_size=30, title_font_family="Balto")
-
-    fig.update_xaxes(matches=None, showticklabels=True)
-    return fig
 
 
 # After initializing your Dash app
 if __name__ == '__main__':
-    app.run_server(debug=True)
+    # Set DASH_DEBUG=1 for the reloader and debugger, which is only served on
+    # localhost; production runs under gunicorn (see Procfile)
+    debug = os.getenv('DASH_DEBUG') == '1'
+    app.run_server(debug=debug, host='127.0.0.1' if debug else '0.0.0.0')
@@ -0,0 +1,29 @@
+// Clientside callbacks for the dropdowns; the server embeds every option
+// list and figure in dcc.Store components at page load
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    figs: {
+        options: function (primary, optionsCache) {
+            if (!primary || !(primary in optionsCache)) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            return optionsCache[primary];
+        },
+
+        pick: function (primary, secondary, figCache) {
+            if (!primary) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+
+            // Only facet when the drill-down differs from the overview category
+            const facet = secondary && secondary !== primary ? secondary : '';
+            const key = primary + '|' + facet;
+            if (!(key in figCache)) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+
+            // Figures are stored as JSON strings; parsing also gives Plotly a
+            // fresh copy to mutate
+            return JSON.parse(figCache[key]);
+        }
+    }
+});